@@ -0,0 +1,754 @@
+"""
+Offline capacity model and profiling report for the AWS stack.
+
+Runs websocket-handler.py and scheduler-executor.py against in-memory fakes
+of DynamoDB, SQS and the API Gateway Management API, across a sweep of
+scales, and reports:
+- hotspots (cProfile, handler code only)
+- allocations per message (tracemalloc)
+- projected DynamoDB RCU/WCU, SQS requests and API Gateway posts per minute
+
+SQS sends are measured; the consumer side of the task queue (receives,
+deletes, redeliveries) is modelled from the queue settings in
+cloudformation-template.yaml.
+
+No AWS credentials or network access are needed.
+
+Usage:
+    python capacity-profile.py
+    python capacity-profile.py --scales 100,1000,10000 --devices-per-zone 20
+    python capacity-profile.py --json > capacity-report.json
+"""
+
+import argparse
+import cProfile
+import contextlib
+import gc
+import importlib.util
+import json
+import math
+import os
+import pstats
+import re
+import sys
+import time
+import tracemalloc
+import types
+from collections import Counter
+from datetime import datetime, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+HANDLER_FILES = {
+    'websocket': os.path.join(HERE, 'websocket-handler.py'),
+    'scheduler': os.path.join(HERE, 'scheduler-executor.py'),
+}
+TEMPLATE_FILE = os.path.join(HERE, 'cloudformation-template.yaml')
+
+# DynamoDB on-demand capacity units
+READ_UNIT_BYTES = 4096
+WRITE_UNIT_BYTES = 1024
+
+
+# ---------------------------------------------------------------------------
+# Local fakes
+# ---------------------------------------------------------------------------
+
+class Metrics:
+    """Request and capacity counters shared by all fakes."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.requests = Counter()
+        self.rcu = Counter()
+        self.wcu = Counter()
+        self.post_bytes = 0
+
+    def read(self, table, op, size, consistent=False):
+        units = max(1, math.ceil(size / READ_UNIT_BYTES))
+        self.requests[('dynamodb', op)] += 1
+        self.rcu[table] += units if consistent else units / 2
+
+    def write(self, table, op, size):
+        self.requests[('dynamodb', op)] += 1
+        self.wcu[table] += max(1, math.ceil(size / WRITE_UNIT_BYTES))
+
+
+def item_size(item):
+    """Approximate DynamoDB item size in bytes."""
+    return len(json.dumps(item, default=str)) if item else 0
+
+
+class Condition:
+    """Stand-in for boto3.dynamodb.conditions key conditions."""
+
+    def __init__(self, test):
+        self.test = test
+
+    def __and__(self, other):
+        return Condition(lambda item: self.test(item) and other.test(item))
+
+
+class Key:
+    def __init__(self, name):
+        self.name = name
+
+    def eq(self, value):
+        return Condition(lambda item: item.get(self.name) == value)
+
+    def gt(self, value):
+        return Condition(lambda item: item.get(self.name, 0) > value)
+
+
+class FakeTable:
+    def __init__(self, name, metrics):
+        self.name = name
+        self.metrics = metrics
+        self.items = {}
+        self.bytes = 0
+
+    def _key(self, key):
+        return tuple(sorted(key.items()))
+
+    def _key_of(self, item):
+        if 'connectionId' in item:
+            return self._key({'connectionId': item['connectionId']})
+        return self._key({'zoneId': item['zoneId'], 'version': item['version']})
+
+    def _store(self, key, item):
+        self.bytes -= item_size(self.items.get(key))
+        self.items[key] = item
+        self.bytes += item_size(item)
+
+    def put_item(self, Item):
+        self._store(self._key_of(Item), dict(Item))
+        self.metrics.write(self.name, 'PutItem', item_size(Item))
+
+    def get_item(self, Key, ConsistentRead=False):
+        item = self.items.get(self._key(Key))
+        self.metrics.read(self.name, 'GetItem', item_size(item), ConsistentRead)
+        return {'Item': dict(item)} if item else {}
+
+    def delete_item(self, Key):
+        key = self._key(Key)
+        item = self.items.pop(key, None)
+        self.bytes -= item_size(item)
+        self.metrics.write(self.name, 'DeleteItem', item_size(item))
+        return {}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues,
+                    ExpressionAttributeNames=None, ReturnValues=None):
+        key = self._key(Key)
+        item = dict(self.items.get(key) or Key)
+        names = ExpressionAttributeNames or {}
+        updated = {}
+
+        for clause in re.split(r'\s(?=(?:SET|REMOVE|ADD)\s)', UpdateExpression.strip()):
+            op, body = clause.split(None, 1)
+            for part in body.split(','):
+                if op == 'REMOVE':
+                    field = names.get(part.strip(), part.strip())
+                    item.pop(field, None)
+                    continue
+                if op == 'SET':
+                    field, value = [p.strip() for p in part.split('=')]
+                    field = names.get(field, field)
+                    item[field] = ExpressionAttributeValues[value]
+                else:
+                    field, value = part.split()
+                    field = names.get(field, field)
+                    item[field] = item.get(field, 0) + ExpressionAttributeValues[value]
+                updated[field] = item[field]
+
+        self._store(key, item)
+        self.metrics.write(self.name, 'UpdateItem', item_size(item))
+        return {'Attributes': updated} if ReturnValues else {}
+
+    def query(self, KeyConditionExpression, ExclusiveStartKey=None):
+        # Pages are not modelled: one call returns everything.
+        items = sorted(
+            (dict(i) for i in self.items.values() if KeyConditionExpression.test(i)),
+            key=lambda i: i.get('version', 0)
+        )
+        self.metrics.read(self.name, 'Query', sum(item_size(i) for i in items))
+        return {'Items': items}
+
+    def scan(self, FilterExpression=None, ExpressionAttributeValues=None,
+             ProjectionExpression=None, ExclusiveStartKey=None):
+        # A scan reads (and is billed for) the whole table, not just matches.
+        # Pages are not modelled: one call returns everything.
+        self.metrics.read(self.name, 'Scan', self.bytes)
+        items = [dict(i) for i in self.items.values()]
+        if FilterExpression:
+            field, placeholder = [p.strip() for p in FilterExpression.split('=')]
+            value = ExpressionAttributeValues[placeholder]
+            items = [i for i in items if i.get(field) == value]
+        if ProjectionExpression:
+            fields = [f.strip() for f in ProjectionExpression.split(',')]
+            items = [{f: i[f] for f in fields if f in i} for i in items]
+        return {'Items': items}
+
+
+class FakeDynamoDB:
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self.tables = {}
+
+    def Table(self, name):
+        if name not in self.tables:
+            self.tables[name] = FakeTable(name, self.metrics)
+        return self.tables[name]
+
+
+class FakeSQS:
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def send_message(self, QueueUrl, MessageBody):
+        self.metrics.requests[('sqs', 'SendMessage')] += 1
+        return {'MessageId': str(self.metrics.requests[('sqs', 'SendMessage')])}
+
+
+class FakeApiGateway:
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def post_to_connection(self, ConnectionId, Data):
+        self.metrics.requests[('apigateway', 'PostToConnection')] += 1
+        self.metrics.post_bytes += len(Data)
+
+
+def install_fake_boto3(metrics):
+    """Register a fake boto3 in sys.modules so the handlers import against it."""
+    dynamodb = FakeDynamoDB(metrics)
+    clients = {
+        'sqs': FakeSQS(metrics),
+        'apigatewaymanagementapi': FakeApiGateway(metrics),
+    }
+
+    boto3 = types.ModuleType('boto3')
+    boto3.resource = lambda name, **kwargs: dynamodb
+    boto3.client = lambda name, **kwargs: clients[name]
+    boto3_dynamodb = types.ModuleType('boto3.dynamodb')
+    conditions = types.ModuleType('boto3.dynamodb.conditions')
+    conditions.Key = Key
+    boto3.dynamodb = boto3_dynamodb
+    boto3_dynamodb.conditions = conditions
+
+    sys.modules['boto3'] = boto3
+    sys.modules['boto3.dynamodb'] = boto3_dynamodb
+    sys.modules['boto3.dynamodb.conditions'] = conditions
+    # scheduler-executor imports requests but does not use it
+    try:
+        import requests  # noqa: F401
+    except ImportError:
+        sys.modules['requests'] = types.ModuleType('requests')
+
+    return dynamodb
+
+
+def load_handler(name):
+    """Import a handler file (hyphenated names are not importable directly)."""
+    spec = importlib.util.spec_from_file_location(f'{name}_handler', HANDLER_FILES[name])
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# ---------------------------------------------------------------------------
+# Workload
+# ---------------------------------------------------------------------------
+
+def ws_event(route_key, connection_id, body=None, query=None):
+    return {
+        'requestContext': {'routeKey': route_key, 'connectionId': connection_id},
+        'queryStringParameters': query,
+        'body': json.dumps(body) if body is not None else None,
+    }
+
+
+def make_schedules(zone_ids, schedules_per_zone):
+    """Synthetic schedule set: a mix of interval and timeline schedules per zone."""
+    intervals = [5, 10, 15, 30, 60]
+    schedules = []
+    for z, zone_id in enumerate(zone_ids):
+        for s in range(schedules_per_zone):
+            schedule_id = f'sched-{z}-{s}'
+            if s % 3 == 2:
+                config = {
+                    'type': 'timeline',
+                    'cycleDurationMinutes': 60,
+                    'announcements': [
+                        {'announcementId': f'ann-{s}-a', 'timestampSeconds': 0},
+                        {'announcementId': f'ann-{s}-b', 'timestampSeconds': 1800},
+                    ],
+                }
+            else:
+                config = {
+                    'type': 'interval',
+                    'intervalMinutes': intervals[(z + s) % len(intervals)],
+                    'announcementIds': [f'ann-{s}-a', f'ann-{s}-b'],
+                    'quietHoursStart': '22:00',
+                    'quietHoursEnd': '07:00',
+                }
+            schedules.append({'id': schedule_id, 'zoneIds': [zone_id], 'enabled': True, 'schedule': config})
+    return schedules
+
+
+def zone_record(zone_id, volume, updated_at):
+    """A zone as the backend's REST API returns (and publishes) it."""
+    return {
+        'id': zone_id,
+        'name': zone_id.replace('-', ' ').title(),
+        'description': '',
+        'floorId': 'floor-0',
+        'clientId': 'client-0',
+        'default_volume': volume,
+        'is_active': True,
+        'image': None,
+        'createdAt': '2026-01-01T00:00:00.000Z',
+        'updatedAt': updated_at,
+        'devices_count': 10,
+        'floor_name': 'Ground',
+        'floor': {'id': 'floor-0', 'name': 'Ground'},
+    }
+
+
+class Workload:
+    """One simulated minute of traffic at a given number of devices."""
+
+    def __init__(self, ws, scheduler, devices, devices_per_zone, schedules_per_zone,
+                 reconnect_rate, zone_changes_per_minute):
+        self.ws = ws
+        self.scheduler = scheduler
+        self.devices = devices
+        self.zone_ids = [f'zone-{z}' for z in range(max(1, devices // devices_per_zone))]
+        self.connection_ids = [f'conn-{d}' for d in range(devices)]
+        self.schedules = make_schedules(self.zone_ids, schedules_per_zone)
+        self.reconnects = int(devices * reconnect_rate)
+        self.zone_changes = int(len(self.zone_ids) * zone_changes_per_minute)
+        self.last_version = {}
+        self.zone_clock = datetime(2026, 1, 1)
+        scheduler.load_schedules = lambda: self.schedules
+
+    def zone_of(self, d):
+        return self.zone_ids[d % len(self.zone_ids)]
+
+    def setup(self):
+        """Connect and subscribe every device (not counted)."""
+        for d, connection_id in enumerate(self.connection_ids):
+            zone_id = self.zone_of(d)
+            self.ws.handler(ws_event('$connect', connection_id, query={'zoneId': zone_id}), None)
+            self.ws.handler(ws_event('$default', connection_id, {'action': 'subscribe', 'zoneId': zone_id}), None)
+        for zone_id in self.zone_ids:
+            # Zones only have delta-sync state if zone changes are modelled
+            if self.zone_changes:
+                self.publish_zone(zone_id, 50)
+                self.last_version[zone_id] = 1
+
+    def publish_zone(self, zone_id, volume):
+        """The backend publishing a saved zone record (zone_changed invocation)."""
+        self.zone_clock += timedelta(seconds=1)
+        updated_at = self.zone_clock.isoformat(timespec='milliseconds') + 'Z'
+        event = {'action': 'zone_changed', 'zoneId': zone_id,
+                 'state': zone_record(zone_id, volume, updated_at)}
+        self.ws.handler(event, None)
+
+    # Individual message types, also used for per-message allocation sampling
+    def message_types(self):
+        types = {
+            'ws:connect': self.connect,
+            'ws:disconnect': self.disconnect,
+            'ws:subscribe(sinceVersion)': self.resubscribe,
+            'ws:ping': self.ping,
+            'ws:batch(ping+status)': self.heartbeat,
+        }
+        if self.zone_changes:
+            types['backend:zone_changed'] = self.zone_change
+        return types
+
+    def connect(self, d):
+        self.ws.handler(ws_event('$connect', self.connection_ids[d], query={'zoneId': self.zone_of(d)}), None)
+
+    def disconnect(self, d):
+        self.ws.handler(ws_event('$disconnect', self.connection_ids[d]), None)
+
+    def resubscribe(self, d):
+        zone_id = self.zone_of(d)
+        body = {'action': 'subscribe', 'zoneId': zone_id, 'sinceVersion': self.last_version.get(zone_id, 0)}
+        self.ws.handler(ws_event('$default', self.connection_ids[d], body), None)
+
+    def ping(self, d):
+        self.ws.handler(ws_event('$default', self.connection_ids[d], {'action': 'ping'}), None)
+
+    def heartbeat(self, d):
+        body = {'action': 'batch', 'ops': [
+            {'action': 'ping'},
+            {'action': 'status', 'status': {'playing': True, 'volume': 50}},
+        ]}
+        self.ws.handler(ws_event('$default', self.connection_ids[d], body), None)
+
+    def zone_change(self, z):
+        """A REST zone edit (PATCH /zones/:id/) reaching the delta-sync log."""
+        self.publish_zone(self.zone_ids[z % len(self.zone_ids)], 40 + z % 20)
+
+    def websocket_minute(self):
+        """Reconnect churn, one heartbeat per device, and zone state changes."""
+        for d in range(self.reconnects):
+            self.disconnect(d)
+            self.connect(d)
+            self.resubscribe(d)
+        for d in range(self.devices):
+            self.heartbeat(d)
+        for z in range(self.zone_changes):
+            self.zone_change(z)
+
+    def scheduler_tick(self):
+        self.scheduler.handler({}, None)
+
+
+# ---------------------------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------------------------
+
+def task_queue_settings():
+    """Read the TaskQueue visibility timeout and long-poll wait from the template."""
+    with open(TEMPLATE_FILE) as f:
+        template = f.read()
+    queue = template[template.index('  TaskQueue:'):]
+
+    def setting(name, default):
+        match = re.search(rf'^\s+{name}:\s*(\d+)', queue, re.MULTILINE)
+        return int(match.group(1)) if match else default
+
+    return {
+        'visibility_timeout': setting('VisibilityTimeout', 30),
+        'wait_seconds': setting('ReceiveMessageWaitTimeSeconds', 0),
+    }
+
+
+def sqs_consumer(sends, args, queue):
+    """
+    Model the Lambda consumer of the task queue for one minute of sends.
+    Messages are received and deleted in batches; a failed message stays
+    invisible for the visibility timeout and is then received again.
+    Each poller also long-polls, costing one empty receive per wait period
+    (an upper bound: busy pollers return early with messages instead).
+    """
+    redelivered = sends * args.consumer_failure_rate
+    idle_receives = args.sqs_pollers * 60 / max(queue['wait_seconds'], 1)
+    receives = math.ceil((sends + redelivered) / args.sqs_batch_size) + idle_receives
+    deletes = math.ceil(sends / args.sqs_batch_size)
+    return {
+        'sends': sends,
+        'receives': receives,
+        'deletes': deletes,
+        'redelivered': redelivered,
+        'total': sends + receives + deletes,
+    }
+
+
+def measure(metrics, fn):
+    """Run fn with request counters reset; return counters and wall time."""
+    metrics.reset()
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    return {
+        'seconds': elapsed,
+        'rcu': sum(metrics.rcu.values()),
+        'wcu': sum(metrics.wcu.values()),
+        'rcu_by_table': dict(metrics.rcu),
+        'wcu_by_table': dict(metrics.wcu),
+        'dynamodb_requests': sum(v for (svc, _), v in metrics.requests.items() if svc == 'dynamodb'),
+        'dynamodb_by_op': {op: v for (svc, op), v in metrics.requests.items() if svc == 'dynamodb'},
+        'sqs_requests': metrics.requests[('sqs', 'SendMessage')],
+        'apigateway_posts': metrics.requests[('apigateway', 'PostToConnection')],
+        'apigateway_bytes': metrics.post_bytes,
+    }
+
+
+def hotspots(fn, top):
+    """Profile fn and return the top handler functions by cumulative time."""
+    profiler = cProfile.Profile()
+    profiler.runcall(fn)
+    stats = pstats.Stats(profiler)
+    handler_paths = set(HANDLER_FILES.values())
+
+    rows = []
+    for (filename, lineno, func), (cc, nc, tt, ct, callers) in stats.stats.items():
+        if os.path.abspath(filename) in handler_paths:
+            rows.append({
+                'function': f'{os.path.basename(filename)}:{lineno}({func})',
+                'calls': nc,
+                'tottime': tt,
+                'cumtime': ct,
+            })
+    rows.sort(key=lambda r: r['cumtime'], reverse=True)
+    return rows[:top]
+
+
+def allocations_per_message(workload, samples):
+    """Average peak and retained traced allocation per message type."""
+    results = {}
+    tracemalloc.start()
+    try:
+        for name, fn in workload.message_types().items():
+            peak_total = 0
+            retained_total = 0
+            for i in range(samples):
+                gc.collect()
+                tracemalloc.reset_peak()
+                before, _ = tracemalloc.get_traced_memory()
+                fn(i % workload.devices)
+                _, peak = tracemalloc.get_traced_memory()
+                # Retained means still reachable, not cyclic garbage awaiting collection
+                gc.collect()
+                after, _ = tracemalloc.get_traced_memory()
+                peak_total += peak - before
+                retained_total += after - before
+            results[name] = {
+                'peak_bytes': peak_total // samples,
+                'retained_bytes': retained_total // samples,
+            }
+    finally:
+        tracemalloc.stop()
+    return results
+
+
+def profile_scale(devices, args):
+    metrics = Metrics()
+    install_fake_boto3(metrics)
+    os.environ['API_GATEWAY_ENDPOINT'] = 'https://fake.execute-api.local'
+    ws = load_handler('websocket')
+    scheduler = load_handler('scheduler')
+
+    workload = Workload(
+        ws, scheduler, devices, args.devices_per_zone, args.schedules_per_zone,
+        args.reconnect_rate, args.zone_changes_per_minute
+    )
+
+    # Discard handler logs unbuffered: a captured or pending log buffer would
+    # show up as retained memory
+    with open(os.devnull, 'w', buffering=1) as devnull, contextlib.redirect_stdout(devnull):
+        workload.setup()
+
+        peak_minute = datetime.now().replace(hour=12, minute=0, second=0, microsecond=0)
+        class FixedDatetime(scheduler.datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return peak_minute.replace(tzinfo=tz)
+
+        scheduler.datetime = FixedDatetime
+
+        websocket = measure(metrics, workload.websocket_minute)
+        plan_build = measure(metrics, workload.scheduler_tick)
+        tick = measure(metrics, workload.scheduler_tick)
+
+        ws_hotspots = hotspots(workload.websocket_minute, args.top)
+        # Profile a cold tick so the daily plan build shows up
+        scheduler.invalidate_playout_plan()
+        scheduler_hotspots = hotspots(workload.scheduler_tick, args.top)
+
+        allocations = allocations_per_message(workload, args.samples)
+        tracemalloc.start()
+        try:
+            gc.collect()
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            workload.scheduler_tick()
+            _, peak = tracemalloc.get_traced_memory()
+            gc.collect()
+            after, _ = tracemalloc.get_traced_memory()
+            allocations['scheduler:tick(warm)'] = {'peak_bytes': peak - before, 'retained_bytes': after - before}
+        finally:
+            tracemalloc.stop()
+
+    daily_sends = sum(
+        len(zone_plan.entries)
+        for plan in scheduler._plan_cache.get('plans', {}).values()
+        for zone_plan in plan['zones'].values()
+    )
+
+    messages = workload.reconnects * 3 + devices + workload.zone_changes
+    queue = task_queue_settings()
+    return {
+        'devices': devices,
+        'zones': len(workload.zone_ids),
+        'schedules': len(workload.schedules),
+        'websocket_messages_per_minute': messages,
+        'websocket': websocket,
+        'scheduler_plan_build': plan_build,
+        'scheduler_tick': tick,
+        'sqs_queue': queue,
+        'sqs_peak': sqs_consumer(tick['sqs_requests'], args, queue),
+        'sqs_average': sqs_consumer(daily_sends / (24 * 60), args, queue),
+        'hotspots': {'websocket': ws_hotspots, 'scheduler': scheduler_hotspots},
+        'allocations': allocations,
+        'connections_table_bytes': ws.connections_table.bytes,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Report
+# ---------------------------------------------------------------------------
+
+def format_report(results, args):
+    lines = []
+    lines.append('Sync2Gear AWS capacity model')
+    lines.append('=' * 60)
+    lines.append(
+        f'Workload per minute: 1 batch(ping+status) per device, '
+        f'{args.reconnect_rate:.0%} reconnects, 1 scheduler tick'
+    )
+    if args.zone_changes_per_minute:
+        lines.append(
+            f'ASSUMED: {args.zone_changes_per_minute:g} REST zone edit(s) per zone per minute, '
+            f'each published to the'
+        )
+        lines.append('WebSocket handler as zone_changed; the edit rate is a guess, not a measurement.')
+    else:
+        lines.append(
+            'No zone state changes modelled (REST zone edits are rare); '
+            'use --zone-changes-per-minute to model them.'
+        )
+    lines.append(
+        f'{args.devices_per_zone} devices per zone, {args.schedules_per_zone} schedules per zone; '
+        f'scheduler measured at 12:00 (all intervals fire)'
+    )
+    lines.append('DynamoDB units are on-demand read/write request units; sizes are approximate.')
+
+    lines.append('')
+    lines.append('Projected load per minute')
+    lines.append('-' * 60)
+    header = f"{'devices':>8} {'zones':>6} {'msgs':>8} {'RCU':>10} {'WCU':>10} {'SQS peak':>9} {'SQS avg':>8} {'APIGW':>8} {'APIGW KB':>9}"
+    lines.append(header)
+    for r in results:
+        ws, tick = r['websocket'], r['scheduler_tick']
+        lines.append(
+            f"{r['devices']:>8} {r['zones']:>6} {r['websocket_messages_per_minute']:>8} "
+            f"{ws['rcu'] + tick['rcu']:>10.1f} {ws['wcu'] + tick['wcu']:>10.0f} "
+            f"{r['sqs_peak']['total']:>9.0f} {r['sqs_average']['total']:>8.1f} "
+            f"{ws['apigateway_posts'] + tick['apigateway_posts']:>8} "
+            f"{(ws['apigateway_bytes'] + tick['apigateway_bytes']) / 1024:>9.1f}"
+        )
+
+    lines.append('')
+    lines.append('Capacity by table (per minute)')
+    lines.append('-' * 60)
+    for r in results:
+        rcu = Counter(r['websocket']['rcu_by_table']) + Counter(r['scheduler_tick']['rcu_by_table'])
+        wcu = Counter(r['websocket']['wcu_by_table']) + Counter(r['scheduler_tick']['wcu_by_table'])
+        tables = sorted(set(rcu) | set(wcu))
+        parts = [f'{t}: {rcu[t]:.1f} RCU / {wcu[t]:.0f} WCU' for t in tables]
+        scans = r['websocket']['dynamodb_by_op'].get('Scan', 0)
+        lines.append(f"{r['devices']:>8} devices: " + '; '.join(parts))
+        lines.append(
+            f"{'':>8}   {scans} connection scans over "
+            f"{r['connections_table_bytes'] / 1024:.0f} KB; "
+            f"daily plan build: {r['scheduler_plan_build']['seconds'] * 1000:.0f} ms, "
+            f"{r['scheduler_plan_build']['apigateway_posts']} plan pushes"
+        )
+
+    queue = results[0]['sqs_queue']
+    lines.append('')
+    lines.append('SQS task queue (per minute; sends measured, consumer modelled)')
+    lines.append('-' * 60)
+    lines.append(
+        f'Consumer: Lambda event source with {args.sqs_pollers} pollers, batch size {args.sqs_batch_size}, '
+        f"{queue['wait_seconds']} s long poll,"
+    )
+    lines.append(
+        f"VisibilityTimeout {queue['visibility_timeout']} s, "
+        f'{args.consumer_failure_rate:.0%} of messages failing (queue settings from the template).'
+    )
+    lines.append(
+        f"A failed play_announcement is redelivered {queue['visibility_timeout']} s later, "
+        f'so its retry plays that late.'
+    )
+    lines.append(f"{'devices':>8} {'minute':>8} {'send':>8} {'receive':>8} {'delete':>8} {'total':>8} {'redeliver':>9}")
+    for r in results:
+        for label, sqs in (('peak', r['sqs_peak']), ('average', r['sqs_average'])):
+            lines.append(
+                f"{r['devices']:>8} {label:>8} {sqs['sends']:>8.1f} {sqs['receives']:>8.1f} "
+                f"{sqs['deletes']:>8} {sqs['total']:>8.1f} {sqs['redelivered']:>9.1f}"
+            )
+
+    for r in results:
+        lines.append('')
+        lines.append(f"Hotspots at {r['devices']} devices")
+        lines.append('-' * 60)
+        for name, rows in r['hotspots'].items():
+            lines.append(f'{name}:')
+            for row in rows:
+                lines.append(
+                    f"  {row['cumtime'] * 1000:>9.1f} ms cum {row['tottime'] * 1000:>9.1f} ms self "
+                    f"{row['calls']:>8} calls  {row['function']}"
+                )
+
+    lines.append('')
+    lines.append('Allocations per message (traced bytes)')
+    lines.append('-' * 60)
+    lines.append(f"{'message':<30}" + ''.join(f"{r['devices']:>12}" for r in results) + '  (peak / retained)')
+    for name in results[0]['allocations']:
+        row = f'{name:<30}'
+        for r in results:
+            a = r['allocations'][name]
+            row += f"{a['peak_bytes']:>7}/{a['retained_bytes']:<4}"
+        lines.append(row)
+
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline capacity model for the Sync2Gear AWS stack')
+    parser.add_argument('--scales', default='100,1000,5000', help='Comma-separated device counts')
+    parser.add_argument('--devices-per-zone', type=int, default=10)
+    parser.add_argument('--schedules-per-zone', type=int, default=3)
+    parser.add_argument('--reconnect-rate', type=float, default=0.05, help='Fraction of devices reconnecting per minute')
+    parser.add_argument('--zone-changes-per-minute', type=float, default=0.0,
+                        help='REST zone edits (zone_changed publishes) per zone per minute (opt-in)')
+    parser.add_argument('--sqs-pollers', type=int, default=5,
+                        help='Concurrent pollers of the task queue event source mapping')
+    parser.add_argument('--sqs-batch-size', type=int, default=10, help='Task queue event source batch size')
+    parser.add_argument('--consumer-failure-rate', type=float, default=0.0,
+                        help='Fraction of task messages whose processing fails and is retried')
+    parser.add_argument('--samples', type=int, default=200, help='Messages sampled per type for allocations')
+    parser.add_argument('--top', type=int, default=8, help='Hotspot rows per handler')
+    parser.add_argument('--json', action='store_true', help='Output raw results as JSON')
+    args = parser.parse_args()
+
+    try:
+        scales = [int(s) for s in args.scales.split(',') if s.strip()]
+    except ValueError:
+        parser.error('--scales must be comma-separated device counts')
+    if not scales or min(scales) < 1:
+        parser.error('--scales values must be at least 1')
+    if args.devices_per_zone < 1:
+        parser.error('--devices-per-zone must be at least 1')
+    if args.schedules_per_zone < 0:
+        parser.error('--schedules-per-zone must not be negative')
+    if not 0 <= args.reconnect_rate <= 1:
+        parser.error('--reconnect-rate must be between 0 and 1')
+    if args.zone_changes_per_minute < 0:
+        parser.error('--zone-changes-per-minute must not be negative')
+    if args.sqs_pollers < 1 or args.sqs_batch_size < 1:
+        parser.error('--sqs-pollers and --sqs-batch-size must be at least 1')
+    if not 0 <= args.consumer_failure_rate <= 1:
+        parser.error('--consumer-failure-rate must be between 0 and 1')
+    if args.samples < 1:
+        parser.error('--samples must be at least 1')
+    if args.top < 0:
+        parser.error('--top must not be negative')
+
+    results = [profile_scale(devices, args) for devices in scales]
+
+    if args.json:
+        print(json.dumps(results, indent=2, default=str))
+    else:
+        print(format_report(results, args))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,21 @@
 """
 EventBridge Lambda function to execute scheduled announcements.
 Runs every minute to check for schedules that need to be executed.
+
+Schedules are expanded once per local day (in each schedule's timezone)
+into a per-zone playout plan, so each tick is a slice lookup instead of a
+full re-evaluation of every schedule.
+Schedule changes bump a shared plan version (via a rebuild_plan event), and
+every warm container rebuilds its plan when it sees a new version.
 """
 
 import json
 import boto3
 import os
 import requests
-from datetime import datetime, timedelta
+from array import array
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
 
 # Initialize clients
 dynamodb = boto3.resource('dynamodb')
@@ -16,21 +24,43 @@ sqs = boto3.client('sqs')
 # Environment variables
 SCHEDULES_TABLE = os.environ.get('SCHEDULES_TABLE_NAME', 'production-sync2gear-schedules')
 TASK_QUEUE_URL = os.environ.get('TASK_QUEUE_URL', '')
+CONNECTIONS_TABLE = os.environ.get('CONNECTIONS_TABLE_NAME', 'production-sync2gear-connections')
+SCHEDULER_STATE_TABLE = os.environ.get('SCHEDULER_STATE_TABLE_NAME', 'production-sync2gear-scheduler-state')
+API_GATEWAY_ENDPOINT = os.environ.get('API_GATEWAY_ENDPOINT', '')
+DEFAULT_TIMEZONE = os.environ.get('DEFAULT_TIMEZONE', 'UTC')
+
+MINUTES_PER_DAY = 24 * 60
+
+# Scheduler state item holding the shared playout plan version
+PLAN_STATE_KEY = 'playout_plan'
+
+# Playout plan cache, kept across warm invocations. Holds
+# {'version': int, 'schedules': {timezone: [schedule]},
+#  'plans': {timezone: {'date': 'YYYY-MM-DD', 'zones': {zoneId: ZonePlan}, 'pushed': bool}}}
+_plan_cache = {}
 
 
 def handler(event, context):
     """
     Check for schedules that need to be executed and trigger them.
     """
-    print(f"Checking schedules at {datetime.now()}")
-    
     try:
-        # Get active schedules from database
-        # In a real implementation, this would query Aurora
-        # For now, we'll use a simplified approach
+        # A schedule change (create/update/toggle/delete) only bumps the shared
+        # plan version; the EventBridge tick is the only thing that executes.
+        if (event or {}).get('action') == 'rebuild_plan':
+            version = bump_plan_version()
+            invalidate_playout_plan()
+            print(f"Playout plan version bumped to {version}")
+            return {
+                'statusCode': 200,
+                'body': json.dumps({'planVersion': version})
+            }
+        
+        now = datetime.now(timezone.utc)
+        print(f"Checking schedules at {now}")
         
         # Get schedules that should execute now
-        schedules_to_execute = get_schedules_to_execute()
+        schedules_to_execute = get_schedules_to_execute(now)
         
         executed_count = 0
         for schedule in schedules_to_execute:
@@ -42,6 +72,9 @@ def handler(event, context):
         
         print(f"Executed {executed_count} schedules")
         
+        # Push a freshly built plan only after the due announcements are sent
+        push_pending_playout_plan()
+        
         return {
             'statusCode': 200,
             'body': json.dumps({
@@ -57,16 +90,359 @@ def handler(event, context):
         }
 
 
-def get_schedules_to_execute():
+def get_schedules_to_execute(now=None):
     """
     Get schedules that should be executed now.
-    This would typically query Aurora database.
+    Looks up the current local minute in each timezone's cached playout plan
+    and groups the due announcements back into per-schedule work items.
+    """
+    now = now or datetime.now(timezone.utc)
+    
+    due = {}
+    for local_now, zones in get_playout_plans(now):
+        # The repeated hour when DST ends has already been played once
+        if local_now.fold:
+            continue
+        minute = local_now.hour * 60 + local_now.minute
+        
+        for zone_id, zone_plan in zones.items():
+            for schedule_id, announcement_id in zone_plan.at(minute):
+                item = due.setdefault(schedule_id, {
+                    'id': schedule_id,
+                    'announcementIds': [],
+                    'zoneIds': [],
+                })
+                if announcement_id not in item['announcementIds']:
+                    item['announcementIds'].append(announcement_id)
+                if zone_id not in item['zoneIds']:
+                    item['zoneIds'].append(zone_id)
+    
+    return list(due.values())
+
+
+def load_schedules():
+    """
+    Load all schedules from the database.
+    This would typically query Aurora database. Each schedule should carry
+    the IANA 'timezone' of its owning client (the user's timezone setting);
+    schedules without one use DEFAULT_TIMEZONE.
     """
     # TODO: Implement database query
     # For now, return empty list
     return []
 
 
+class ZonePlan:
+    """
+    Compact playout timeline for one zone and one day.
+    
+    Entries are stored sorted by minute, with an offsets array indexed by
+    minute of day, so the entries for minute m are
+    entries[offsets[m]:offsets[m + 1]].
+    """
+    
+    __slots__ = ('offsets', 'entries')
+    
+    def __init__(self, slots):
+        """Build from a list of (minute, scheduleId, announcementId) tuples."""
+        # Only compare minutes: ids may be of mixed types
+        slots = sorted(dict.fromkeys(slots), key=lambda slot: slot[0])
+        self.entries = [(schedule_id, announcement_id) for _, schedule_id, announcement_id in slots]
+        self.offsets = array('I', [0]) * (MINUTES_PER_DAY + 1)
+        
+        position = 0
+        for minute in range(MINUTES_PER_DAY):
+            self.offsets[minute] = position
+            while position < len(slots) and slots[position][0] == minute:
+                position += 1
+        self.offsets[MINUTES_PER_DAY] = position
+    
+    def at(self, minute):
+        """Return the (scheduleId, announcementId) entries due at a minute of day."""
+        return self.entries[self.offsets[minute]:self.offsets[minute + 1]]
+    
+    def timeline(self):
+        """Return the plan as a list of {'minute', 'announcementIds'} for devices."""
+        timeline = []
+        for minute in range(MINUTES_PER_DAY):
+            entries = self.at(minute)
+            if entries:
+                announcement_ids = []
+                for _, announcement_id in entries:
+                    if announcement_id not in announcement_ids:
+                        announcement_ids.append(announcement_id)
+                timeline.append({'minute': minute, 'announcementIds': announcement_ids})
+        return timeline
+
+
+def get_playout_plans(now):
+    """
+    Return (local now, {zoneId: ZonePlan}) for each schedule timezone.
+    Schedules are only loaded when the shared plan version changes, and a
+    timezone's plan is only rebuilt when its local day changes; other ticks
+    cost one GetItem and use the cached plans as-is.
+    """
+    version = get_plan_version()
+    if version is None:
+        # Version unreadable: keep the cached plans rather than rebuild every tick
+        version = _plan_cache.get('version', 0)
+    
+    if not _plan_cache or _plan_cache['version'] != version:
+        schedules = group_schedules_by_timezone(load_schedules())
+        _plan_cache.clear()
+        _plan_cache.update({'version': version, 'schedules': schedules, 'plans': {}})
+    
+    plans = []
+    for tz_name, schedules in _plan_cache['schedules'].items():
+        local_now = now.astimezone(ZoneInfo(tz_name))
+        date_key = local_now.date().isoformat()
+        
+        plan = _plan_cache['plans'].get(tz_name)
+        if plan is None or plan['date'] != date_key:
+            zones = build_playout_plan(schedules, local_now.date())
+            plan = {'date': date_key, 'zones': zones, 'pushed': False}
+            _plan_cache['plans'][tz_name] = plan
+            print(f"Built playout plan v{version} for {date_key} ({tz_name}): {len(zones)} zones")
+        
+        plans.append((local_now, plan['zones']))
+    
+    return plans
+
+
+def group_schedules_by_timezone(schedules):
+    """Group schedules by IANA timezone, falling back to DEFAULT_TIMEZONE."""
+    schedules_by_timezone = {}
+    
+    for schedule in schedules:
+        tz_name = schedule.get('timezone') or DEFAULT_TIMEZONE
+        try:
+            ZoneInfo(tz_name)
+        except Exception as e:
+            print(f"Unknown timezone {tz_name!r} for schedule {schedule.get('id')}: {e}")
+            tz_name = DEFAULT_TIMEZONE
+        schedules_by_timezone.setdefault(tz_name, []).append(schedule)
+    
+    return schedules_by_timezone
+
+
+def invalidate_playout_plan():
+    """Drop the cached playout plan so the next tick rebuilds it."""
+    _plan_cache.clear()
+
+
+def get_plan_version():
+    """Read the shared playout plan version, or None if it cannot be read."""
+    try:
+        state_table = dynamodb.Table(SCHEDULER_STATE_TABLE)
+        response = state_table.get_item(Key={'stateKey': PLAN_STATE_KEY})
+        return int(response.get('Item', {}).get('planVersion', 0))
+    except Exception as e:
+        print(f"Error reading playout plan version: {e}")
+        return None
+
+
+def bump_plan_version():
+    """Increment the shared playout plan version so every container rebuilds."""
+    state_table = dynamodb.Table(SCHEDULER_STATE_TABLE)
+    response = state_table.update_item(
+        Key={'stateKey': PLAN_STATE_KEY},
+        UpdateExpression='ADD planVersion :one SET updatedAt = :now',
+        ExpressionAttributeValues={':one': 1, ':now': datetime.now().isoformat()},
+        ReturnValues='UPDATED_NEW'
+    )
+    return int(response['Attributes']['planVersion'])
+
+
+def push_pending_playout_plan():
+    """Push cached plans to devices if they were rebuilt and not yet pushed."""
+    pending = {}
+    for plan in _plan_cache.get('plans', {}).values():
+        if not plan['pushed']:
+            plan['pushed'] = True
+            for zone_id, zone_plan in plan['zones'].items():
+                pending[zone_id] = (plan['date'], zone_plan)
+    
+    if pending:
+        push_playout_plan(pending)
+
+
+def build_playout_plan(schedules, day):
+    """Expand all enabled schedules into a {zoneId: ZonePlan} for a day."""
+    slots_by_zone = {}
+    
+    for schedule in schedules:
+        if not schedule.get('enabled', True):
+            continue
+        
+        schedule_id = schedule.get('id')
+        try:
+            zone_ids = get_schedule_zone_ids(schedule)
+            slots = [
+                (minute, schedule_id, announcement_id)
+                for minute, announcement_id in expand_schedule(schedule, day)
+                if announcement_id is not None
+            ]
+            # ZonePlan deduplicates slots, so ids must be hashable
+            hash(tuple(slots))
+            hash(tuple(zone_ids))
+        except Exception as e:
+            print(f"Error expanding schedule {schedule_id}: {e}")
+            continue
+        
+        for zone_id in zone_ids:
+            slots_by_zone.setdefault(zone_id, []).extend(slots)
+    
+    plan = {}
+    for zone_id, slots in slots_by_zone.items():
+        try:
+            plan[zone_id] = ZonePlan(slots)
+        except Exception as e:
+            print(f"Error building playout plan for zone {zone_id}: {e}")
+    return plan
+
+
+def get_schedule_zone_ids(schedule):
+    """Return the zone ids a schedule targets."""
+    zone_ids = schedule.get('zoneIds') or schedule.get('zones') or []
+    return [z.get('id') if isinstance(z, dict) else z for z in zone_ids]
+
+
+def expand_schedule(schedule, day):
+    """Return the (minute, announcementId) occurrences of a schedule on a day."""
+    config = schedule.get('schedule') or schedule.get('schedule_config') or {}
+    schedule_type = config.get('type')
+    occurrences = []
+    
+    if schedule_type == 'interval':
+        interval = int(config.get('intervalMinutes') or 0)
+        if interval <= 0:
+            return []
+        quiet_start = parse_time_of_day(config.get('quietHoursStart'))
+        quiet_end = parse_time_of_day(config.get('quietHoursEnd'))
+        for minute in range(0, MINUTES_PER_DAY, interval):
+            if in_quiet_hours(minute, quiet_start, quiet_end):
+                continue
+            for announcement_id in config.get('announcementIds', []):
+                occurrences.append((minute, announcement_id))
+    
+    elif schedule_type == 'timeline':
+        cycle = int(config.get('cycleDurationMinutes') or 0)
+        if cycle <= 0:
+            return []
+        for slot in config.get('announcements', []):
+            offset = int(slot.get('timestampSeconds', 0)) // 60
+            for minute in range(offset % cycle, MINUTES_PER_DAY, cycle):
+                occurrences.append((minute, slot.get('announcementId')))
+    
+    elif schedule_type == 'datetime':
+        for slot in config.get('dateTimeSlots', []):
+            if slot_occurs_on(slot, day):
+                minute = parse_time_of_day(slot.get('time'))
+                if minute is not None:
+                    occurrences.append((minute, slot.get('announcementId')))
+    
+    return occurrences
+
+
+def slot_occurs_on(slot, day):
+    """Check whether a datetime slot (with its repeat rule) falls on a day."""
+    start = datetime.strptime(slot['date'], '%Y-%m-%d').date()
+    if day < start:
+        return False
+    if slot.get('endDate') and day > datetime.strptime(slot['endDate'], '%Y-%m-%d').date():
+        return False
+    
+    repeat = slot.get('repeat') or 'none'
+    if repeat == 'daily':
+        return True
+    if repeat == 'weekly':
+        # Sunday=0, matching the frontend's repeatDays
+        weekday = (day.weekday() + 1) % 7
+        repeat_days = slot.get('repeatDays') or [(start.weekday() + 1) % 7]
+        return weekday in repeat_days
+    if repeat == 'monthly':
+        return day.day == start.day
+    if repeat == 'yearly':
+        return (day.month, day.day) == (start.month, start.day)
+    return day == start
+
+
+def parse_time_of_day(value):
+    """Parse 'HH:mm' or 'hh:mm AM/PM' into minutes since midnight."""
+    if not value:
+        return None
+    value = value.strip().upper()
+    for fmt in ('%H:%M', '%I:%M %p', '%I:%M%p'):
+        try:
+            parsed = datetime.strptime(value, fmt)
+            return parsed.hour * 60 + parsed.minute
+        except ValueError:
+            continue
+    return None
+
+
+def in_quiet_hours(minute, quiet_start, quiet_end):
+    """Check whether a minute of day falls in quiet hours (may wrap midnight)."""
+    if quiet_start is None or quiet_end is None or quiet_start == quiet_end:
+        return False
+    if quiet_start < quiet_end:
+        return quiet_start <= minute < quiet_end
+    return minute >= quiet_start or minute < quiet_end
+
+
+def push_playout_plan(zone_plans):
+    """
+    Push each zone's playout plan to its connected devices over the
+    WebSocket API, so playback does not depend on tick latency.
+    zone_plans maps zoneId to (local date, ZonePlan).
+    """
+    if not API_GATEWAY_ENDPOINT or not zone_plans:
+        return
+    
+    try:
+        apigw = boto3.client('apigatewaymanagementapi', endpoint_url=API_GATEWAY_ENDPOINT)
+        connections_by_zone = get_connections_by_zone()
+        
+        for zone_id, connection_ids in connections_by_zone.items():
+            if zone_id not in zone_plans:
+                continue
+            date_key, zone_plan = zone_plans[zone_id]
+            
+            message = json.dumps({
+                'action': 'playout_plan',
+                'zoneId': zone_id,
+                'date': date_key,
+                'timeline': zone_plan.timeline()
+            }).encode('utf-8')
+            
+            for connection_id in connection_ids:
+                try:
+                    apigw.post_to_connection(ConnectionId=connection_id, Data=message)
+                except Exception as e:
+                    print(f"Error pushing plan to {connection_id}: {e}")
+    except Exception as e:
+        print(f"Error pushing playout plan: {e}")
+
+
+def get_connections_by_zone():
+    """Scan the connections table once and group connection ids by zoneId."""
+    connections_table = dynamodb.Table(CONNECTIONS_TABLE)
+    connections_by_zone = {}
+    scan_kwargs = {
+        'ProjectionExpression': 'connectionId, zoneId'
+    }
+    
+    while True:
+        response = connections_table.scan(**scan_kwargs)
+        for item in response.get('Items', []):
+            if item.get('zoneId'):
+                connections_by_zone.setdefault(item['zoneId'], []).append(item['connectionId'])
+        
+        if 'LastEvaluatedKey' not in response:
+            return connections_by_zone
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
 def execute_schedule(schedule):
     """
     Execute a schedule by sending announcement play request.
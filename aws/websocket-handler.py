@@ -8,10 +8,25 @@ import boto3
 import os
 import time
 from decimal import Decimal
+from boto3.dynamodb.conditions import Key
 
 # Initialize DynamoDB
 dynamodb = boto3.resource('dynamodb')
 connections_table = dynamodb.Table(os.environ.get('CONNECTIONS_TABLE_NAME', 'production-sync2gear-connections'))
+zone_state_table = dynamodb.Table(os.environ.get('ZONE_STATE_TABLE_NAME', 'production-sync2gear-zone-state'))
+
+# Number of zone changes kept for delta sync; older versions get a snapshot
+ZONE_CHANGE_LOG_SIZE = int(os.environ.get('ZONE_CHANGE_LOG_SIZE', '100'))
+
+# Maximum number of ops accepted in one batch message
+MAX_BATCH_OPS = int(os.environ.get('MAX_BATCH_OPS', '25'))
+
+# Zone state items: version 0 is the head (latest version + current state),
+# versions >= 1 are the change log entries.
+ZONE_HEAD_VERSION = 0
+ZONE_KEY_ATTRIBUTES = ('zoneId', 'version', 'ttl')
+# Attributes that are never part of the zone state itself
+ZONE_RESERVED_ATTRIBUTES = ZONE_KEY_ATTRIBUTES + ('latestVersion',)
 
 # Initialize API Gateway Management API
 apigw = boto3.client('apigatewaymanagementapi', 
@@ -25,7 +40,14 @@ def handler(event, context):
     - $connect: Store connection in DynamoDB
     - $disconnect: Remove connection from DynamoDB
     - $default: Handle custom messages
+    
+    Direct invocations (no requestContext) come from the backend, which is
+    authorized by IAM rather than by the WebSocket API:
+    - zone_changed: Publish a zone's new state to subscribers
     """
+    if 'requestContext' not in event and event.get('action') == 'zone_changed':
+        return handle_zone_changed(event, context)
+    
     route_key = event.get('requestContext', {}).get('routeKey')
     connection_id = event.get('requestContext', {}).get('connectionId')
     
@@ -106,23 +128,28 @@ def handle_message(event, context):
     body = event.get('body', '{}')
     
     try:
-        message = json.loads(body)
-        action = message.get('action')
+        # Decimal floats so reported values can be written to DynamoDB as-is
+        message = json.loads(body, parse_float=Decimal)
+        updates = {}
         
-        if action == 'ping':
-            # Respond to ping
-            send_message(connection_id, {'action': 'pong'})
-        elif action == 'subscribe':
-            # Subscribe to zone updates
-            zone_id = message.get('zoneId')
-            update_connection_zone(connection_id, zone_id)
-            send_message(connection_id, {'action': 'subscribed', 'zoneId': zone_id})
-        elif action == 'unsubscribe':
-            # Unsubscribe from zone updates
-            update_connection_zone(connection_id, None)
-            send_message(connection_id, {'action': 'unsubscribed'})
+        if isinstance(message, dict) and message.get('action') == 'batch':
+            # Run all ops in one invocation and reply with one frame
+            ops = message.get('ops')
+            if not isinstance(ops, list):
+                reply = {'action': 'batch', 'error': 'ops must be a list'}
+            elif len(ops) > MAX_BATCH_OPS:
+                reply = {'action': 'batch', 'error': f'Too many ops (max {MAX_BATCH_OPS})'}
+            else:
+                reply = {'action': 'batch', 'results': [
+                    process_batch_op(connection_id, op, updates) for op in ops
+                ]}
         else:
-            send_message(connection_id, {'error': 'Unknown action'})
+            reply = process_action(connection_id, message, updates)
+        
+        # All connection writes from this message go out as one update
+        if updates:
+            update_connection(connection_id, updates)
+        send_message(connection_id, reply)
         
         return {
             'statusCode': 200,
@@ -136,29 +163,134 @@ def handle_message(event, context):
         }
 
 
+def handle_zone_changed(event, context):
+    """Handle a zone record saved by the backend's REST API."""
+    zone_id = event.get('zoneId')
+    state = event.get('state')
+    if not zone_id or not isinstance(state, dict):
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': 'zone_changed requires zoneId and state'})
+        }
+    
+    try:
+        # Decimal floats so the state can be written to DynamoDB as-is
+        state = json.loads(json.dumps(state), parse_float=Decimal)
+        version = publish_zone_state(zone_id, state)
+        return {
+            'statusCode': 200,
+            'body': json.dumps({'zoneId': zone_id, 'version': version})
+        }
+    except Exception as e:
+        print(f"Error publishing state for zone {zone_id}: {e}")
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': 'Zone publish failed'})
+        }
+
+
+def process_batch_op(connection_id, op, updates):
+    """Run one batch op so that a failing op only fails its own result slot."""
+    try:
+        return process_action(connection_id, op, updates)
+    except Exception as e:
+        print(f"Error handling batch op: {e}")
+        return {'error': 'Op processing failed'}
+
+
+def process_action(connection_id, message, updates):
+    """
+    Handle a single action and return its reply.
+    Connection attribute writes are collected in updates for the caller.
+    """
+    if not isinstance(message, dict):
+        return {'error': 'Invalid op'}
+    
+    action = message.get('action')
+    
+    if action == 'ping':
+        # Respond to ping
+        return {'action': 'pong'}
+    elif action == 'subscribe':
+        # Subscribe to zone updates
+        zone_id = message.get('zoneId')
+        since_version = message.get('sinceVersion')
+        if since_version is not None:
+            since_version = parse_version(since_version)
+            if since_version is None:
+                return {'error': 'sinceVersion must be an integer'}
+        reply = {'action': 'subscribed', 'zoneId': zone_id}
+        if since_version is not None and zone_id:
+            # Versioned subscribe: catch the client up after a reconnect
+            reply.update(get_zone_sync(zone_id, since_version))
+        updates['zoneId'] = zone_id or ''
+        return reply
+    elif action == 'unsubscribe':
+        # Unsubscribe from zone updates
+        updates['zoneId'] = ''
+        return {'action': 'unsubscribed'}
+    elif action == 'status':
+        # Device status report
+        updates['status'] = message.get('status') or {}
+        updates['lastSeenAt'] = Decimal(str(time.time()))
+        return {'action': 'status_received'}
+    elif action == 'batch':
+        return {'error': 'Nested batch not allowed'}
+    else:
+        return {'error': 'Unknown action'}
+
+
+def parse_version(value):
+    """Parse a client-supplied version number, or return None if invalid."""
+    if isinstance(value, bool):
+        return None
+    try:
+        version = int(value)
+    except (TypeError, ValueError):
+        return None
+    # Reject fractional numbers such as 2.5 instead of truncating them
+    if not isinstance(value, str) and version != value:
+        return None
+    return version
+
+
 def send_message(connection_id, message):
     """Send message to WebSocket connection."""
     try:
         apigw.post_to_connection(
             ConnectionId=connection_id,
-            Data=json.dumps(message).encode('utf-8')
+            Data=json.dumps(message, default=json_default).encode('utf-8')
         )
     except Exception as e:
         print(f"Error sending message to {connection_id}: {e}")
 
 
-def update_connection_zone(connection_id, zone_id):
-    """Update the zone subscription for a connection."""
+def json_default(value):
+    """Serialize DynamoDB Decimals in outgoing messages."""
+    if isinstance(value, Decimal):
+        return int(value) if value % 1 == 0 else float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def update_connection(connection_id, attributes):
+    """Update connection attributes (zone subscription, status) in one write."""
     try:
+        names = {}
+        values = {}
+        assignments = []
+        for i, (field, value) in enumerate(attributes.items()):
+            names[f'#a{i}'] = field
+            values[f':a{i}'] = value
+            assignments.append(f'#a{i} = :a{i}')
+        
         connections_table.update_item(
             Key={'connectionId': connection_id},
-            UpdateExpression='SET zoneId = :zoneId',
-            ExpressionAttributeValues={
-                ':zoneId': zone_id or ''
-            }
+            UpdateExpression='SET ' + ', '.join(assignments),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values
         )
     except Exception as e:
-        print(f"Error updating connection zone: {e}")
+        print(f"Error updating connection: {e}")
 
 
 def broadcast_to_zone(zone_id, message):
@@ -179,3 +311,145 @@ def broadcast_to_zone(zone_id, message):
     except Exception as e:
         print(f"Error broadcasting to zone {zone_id}: {e}")
 
+
+def get_zone_sync(zone_id, since_version):
+    """
+    Build the catch-up payload for a versioned subscribe.
+    
+    Returns the changes after since_version from the zone change log, or a
+    full snapshot when since_version is older than the log retains. Zones
+    with no recorded state get a refetch signal, so clients fall back to
+    loading zone state over REST instead of assuming they are up to date.
+    """
+    head = zone_state_table.get_item(
+        Key={'zoneId': zone_id, 'version': ZONE_HEAD_VERSION}
+    ).get('Item')
+    if not head:
+        return {'refetch': True}
+    
+    latest_version = int(head.get('latestVersion', 0))
+    
+    if since_version == latest_version:
+        return {'version': latest_version, 'deltas': []}
+    
+    # Unknown (ahead of the server) or too old for the change log
+    if (since_version < 0 or since_version > latest_version
+            or latest_version - since_version > ZONE_CHANGE_LOG_SIZE):
+        return {'version': latest_version, 'snapshot': zone_fields(head)}
+    
+    # Follow pages: a query returns at most 1 MB of log entries per call
+    query_kwargs = {
+        'KeyConditionExpression': Key('zoneId').eq(zone_id) & Key('version').gt(since_version)
+    }
+    deltas = []
+    while True:
+        response = zone_state_table.query(**query_kwargs)
+        deltas.extend(
+            {'version': item['version'], 'changes': item.get('changes', {})}
+            for item in response.get('Items', [])
+        )
+        if 'LastEvaluatedKey' not in response:
+            break
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    
+    # A gap means log entries were trimmed or expired; fall back to a snapshot
+    if not deltas or int(deltas[0]['version']) != since_version + 1:
+        return {'version': latest_version, 'snapshot': zone_fields(head)}
+    
+    return {'version': deltas[-1]['version'], 'deltas': deltas}
+
+
+def zone_fields(item):
+    """Return the zone state fields of an item (head item or zone record)."""
+    return {
+        k: v for k, v in item.items()
+        if k not in ZONE_RESERVED_ATTRIBUTES
+    }
+
+
+def record_zone_change(zone_id, changes):
+    """
+    Apply changes to the zone head and append them to the change log.
+    Fields changed to None are removed from the head.
+    Returns the new zone version.
+    """
+    names = {'#latestVersion': 'latestVersion'}
+    values = {':one': 1}
+    assignments = []
+    removals = []
+    for i, (field, value) in enumerate(changes.items()):
+        names[f'#f{i}'] = field
+        if value is None:
+            removals.append(f'#f{i}')
+        else:
+            values[f':v{i}'] = value
+            assignments.append(f'#f{i} = :v{i}')
+    
+    update_expression = 'ADD #latestVersion :one'
+    if removals:
+        update_expression = 'REMOVE ' + ', '.join(removals) + ' ' + update_expression
+    if assignments:
+        update_expression = 'SET ' + ', '.join(assignments) + ' ' + update_expression
+    
+    response = zone_state_table.update_item(
+        Key={'zoneId': zone_id, 'version': ZONE_HEAD_VERSION},
+        UpdateExpression=update_expression,
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=values,
+        ReturnValues='UPDATED_NEW'
+    )
+    version = int(response['Attributes']['latestVersion'])
+    
+    zone_state_table.put_item(
+        Item={
+            'zoneId': zone_id,
+            'version': version,
+            'changes': changes,
+            'ttl': int(time.time()) + 86400  # 24 hours
+        }
+    )
+    
+    # Keep the change log bounded
+    expired_version = version - ZONE_CHANGE_LOG_SIZE
+    if expired_version > ZONE_HEAD_VERSION:
+        zone_state_table.delete_item(
+            Key={'zoneId': zone_id, 'version': expired_version}
+        )
+    
+    return version
+
+
+def publish_zone_state(zone_id, state):
+    """
+    Bring the zone head in line with the full zone record, then record and
+    broadcast the fields that changed (None for fields that were cleared).
+    Returns the zone version.
+    """
+    state = zone_fields(state)
+    head = zone_state_table.get_item(
+        Key={'zoneId': zone_id, 'version': ZONE_HEAD_VERSION},
+        ConsistentRead=True
+    ).get('Item') or {}
+    current = zone_fields(head)
+    latest_version = int(head.get('latestVersion', 0))
+    
+    # Async invocations can arrive out of order; never roll the head back
+    if str(state.get('updatedAt', '')) < str(current.get('updatedAt', '')):
+        return latest_version
+    
+    fields = list(state) + [field for field in current if field not in state]
+    changes = {
+        field: state.get(field) for field in fields
+        if state.get(field) != current.get(field)
+    }
+    if not changes:
+        return latest_version
+    
+    version = record_zone_change(zone_id, changes)
+    broadcast_to_zone(zone_id, {
+        'action': 'zone_update',
+        'zoneId': zone_id,
+        'version': version,
+        'changes': changes
+    })
+    return version
@@ -0,0 +1,439 @@
+"""
+API Load Runner
+Replays mixed traffic (login, list music, create announcement, zone updates,
+schedule toggles) against a local backend with N concurrent virtual users.
+
+Requests arrive open-loop (Poisson arrivals at a fixed rate, independent of
+response times), so latency includes time spent queued behind a saturated
+backend. Run several rates to find the throughput ceiling:
+
+    python load_test.py --users 20 --rates 5,10,20,50 --duration 30
+
+By default only read traffic is sent. --allow-writes adds the write
+operations; everything they create is deleted, and changed zone volumes and
+schedule states are restored, when the run ends.
+"""
+
+import argparse
+import bisect
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+API_BASE = 'http://localhost:8000/api/v1'
+
+# Relative weights of each operation in the traffic mix
+TRAFFIC_MIX = {
+    'login': 5,
+    'list_music': 40,
+    'create_announcement': 10,
+    'update_zone': 20,
+    'toggle_schedule': 25,
+}
+
+# Operations that create or change data; only sent with --allow-writes
+WRITE_OPERATIONS = {'create_announcement', 'update_zone', 'toggle_schedule'}
+
+# Endpoint label reported for each operation
+ENDPOINT_LABELS = {
+    'login': 'POST /auth/login/',
+    'list_music': 'GET /music/files/',
+    'create_announcement': 'POST /announcements/tts/',
+    'update_zone': 'PATCH /zones/zones/:id/',
+    'toggle_schedule': 'POST /schedules/schedules/:id/toggle/',
+}
+
+# Histogram bucket upper bounds in milliseconds
+BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+
+class SessionPool:
+    """One pooled HTTP session per worker thread, sized to the concurrency."""
+
+    def __init__(self, pool_size):
+        self.pool_size = pool_size
+        self.local = threading.local()
+
+    def get(self):
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self.local.session = session
+        return session
+
+
+class VirtualUser:
+    """A logged-in user with the ids needed to drive the traffic mix."""
+
+    def __init__(self, index, email, password):
+        self.index = index
+        self.email = email
+        self.password = password
+        self.token = None
+        self.client_id = None
+        self.zone_ids = []
+        self.schedule_ids = []
+        self.announcement_ids = []
+        self.counter = 0
+
+    @property
+    def headers(self):
+        return {'Authorization': f'Bearer {self.token}'}
+
+
+class Stats:
+    """Thread-safe per-endpoint latency and error recording."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.status_codes = defaultdict(lambda: defaultdict(int))
+
+    def record(self, endpoint, latency_ms, status):
+        with self.lock:
+            self.latencies[endpoint].append(latency_ms)
+            self.status_codes[endpoint][status] += 1
+            if not isinstance(status, int) or status >= 400:
+                self.errors[endpoint] += 1
+
+
+def login(session, user):
+    """Login a virtual user (as in test_auth.py / simple_populate_data.py)"""
+    response = session.post(f'{API_BASE}/auth/login/', json={
+        'email': user.email,
+        'password': user.password
+    }, timeout=30)
+    if response.status_code == 200:
+        user.token = response.json()['access']
+    return response
+
+
+def try_login(session, user):
+    """Login during setup; returns False instead of raising on failure."""
+    try:
+        return login(session, user).status_code == 200
+    except Exception as e:
+        print(f"  ⚠️  User {user.index}: {type(e).__name__}: {e}")
+        return False
+
+
+def prepare_shared_ids(session, user):
+    """
+    Look up the client, zones and schedules the virtual users will touch.
+    Runs once, before the users start, so a run creates at most one zone
+    and one schedule when the account has none. Also records what the run
+    creates and the original zone volumes and schedule states, for clean_up.
+    """
+    shared = {
+        'client_id': None,
+        'zone_ids': [],
+        'schedule_ids': [],
+        'zone_volumes': {},
+        'schedule_enabled': {},
+        'created_zone_ids': [],
+        'created_schedule_ids': [],
+    }
+
+    me = session.get(f'{API_BASE}/auth/me/', headers=user.headers, timeout=30)
+    if me.status_code == 200:
+        body = me.json()
+        shared['client_id'] = body.get('client_id') or body.get('clientId')
+
+    # Admins without a client use the first client, like simple_populate_data.py
+    if not shared['client_id']:
+        clients_res = session.get(f'{API_BASE}/admin/clients/', headers=user.headers, timeout=30)
+        if clients_res.status_code == 200:
+            clients = clients_res.json()
+            if isinstance(clients, dict):
+                clients = clients.get('results', [])
+            if clients:
+                shared['client_id'] = clients[0].get('id')
+
+    zones_res = session.get(f'{API_BASE}/zones/zones/', headers=user.headers, timeout=30)
+    if zones_res.status_code == 200:
+        zones = [z for z in results_of(zones_res.json()) if z.get('id')]
+        shared['zone_ids'] = [z['id'] for z in zones]
+        shared['zone_volumes'] = {z['id']: z['default_volume'] for z in zones if 'default_volume' in z}
+    if not shared['zone_ids']:
+        data = {'name': 'Load Test Zone', 'description': 'Created by load_test.py'}
+        if shared['client_id']:
+            data['client_id'] = shared['client_id']
+        res = session.post(f'{API_BASE}/zones/zones/', headers=user.headers, json=data, timeout=30)
+        if res.status_code in [200, 201]:
+            shared['zone_ids'] = [res.json().get('id')]
+            shared['created_zone_ids'] = list(shared['zone_ids'])
+
+    schedules_res = session.get(f'{API_BASE}/schedules/schedules/', headers=user.headers, timeout=30)
+    if schedules_res.status_code == 200:
+        schedules = [s for s in results_of(schedules_res.json()) if s.get('id')]
+        shared['schedule_ids'] = [s['id'] for s in schedules]
+        shared['schedule_enabled'] = {s['id']: s['enabled'] for s in schedules if 'enabled' in s}
+    if not shared['schedule_ids']:
+        res = session.post(f'{API_BASE}/schedules/schedules/', headers=user.headers, json={
+            'name': 'Load Test Schedule',
+            'schedule_config': {'type': 'interval', 'intervalMinutes': 60, 'announcementIds': []},
+            'zones': shared['zone_ids'],
+            'enabled': True
+        }, timeout=30)
+        if res.status_code in [200, 201]:
+            shared['schedule_ids'] = [res.json().get('id')]
+            shared['created_schedule_ids'] = list(shared['schedule_ids'])
+
+    return shared
+
+
+def clean_up(session, user, shared, users):
+    """
+    Undo a --allow-writes run: delete the announcements, schedule and zone it
+    created, and restore the original zone volumes and schedule states.
+    """
+    undo = []
+    for u in users:
+        for announcement_id in u.announcement_ids:
+            undo.append(('DELETE', f'/announcements/{announcement_id}/', None))
+    for zone_id, volume in shared['zone_volumes'].items():
+        undo.append(('PATCH', f'/zones/zones/{zone_id}/', {'default_volume': volume}))
+    for schedule_id, enabled in shared['schedule_enabled'].items():
+        undo.append(('POST', f'/schedules/schedules/{schedule_id}/toggle/', {'enabled': enabled}))
+    # Schedules first: they may target the zone being deleted
+    for schedule_id in shared['created_schedule_ids']:
+        undo.append(('DELETE', f'/schedules/schedules/{schedule_id}/', None))
+    for zone_id in shared['created_zone_ids']:
+        undo.append(('DELETE', f'/zones/zones/{zone_id}/', None))
+
+    print(f"\n🧹 Cleaning up ({len(undo)} requests)...")
+    failed = 0
+    for method, path, body in undo:
+        try:
+            status = session.request(
+                method, f'{API_BASE}{path}', headers=user.headers, json=body, timeout=30).status_code
+        except Exception as e:
+            status = type(e).__name__
+        if not isinstance(status, int) or status >= 400:
+            failed += 1
+            print(f"  ⚠️  {method} {path}: {status}")
+    if failed:
+        print(f"  ❌ {failed} cleanup request(s) failed; remove leftover load test data by hand")
+    else:
+        print("  ✅ Created data deleted, zone volumes and schedule states restored")
+
+
+def results_of(body):
+    """Unwrap list responses that may or may not be paginated."""
+    if isinstance(body, dict):
+        return body.get('results', [])
+    return body if isinstance(body, list) else []
+
+
+def run_operation(session, user, operation):
+    """Issue one request for an operation and return the response."""
+    user.counter += 1
+
+    if operation == 'login':
+        return login(session, user)
+
+    if operation == 'list_music':
+        return session.get(
+            f'{API_BASE}/music/files/', headers=user.headers, timeout=30)
+
+    if operation == 'create_announcement':
+        data = {
+            'title': f'Load Test {user.index}-{user.counter}',
+            'text': 'Attention shoppers, this is a load test announcement.'
+        }
+        if user.client_id:
+            data['client_id'] = user.client_id
+        response = session.post(
+            f'{API_BASE}/announcements/tts/', headers=user.headers, json=data, timeout=30)
+        if response.status_code == 201:
+            user.announcement_ids.append(response.json().get('id'))
+        return response
+
+    if operation == 'update_zone':
+        zone_id = random.choice(user.zone_ids) if user.zone_ids else 'missing'
+        return session.patch(
+            f'{API_BASE}/zones/zones/{zone_id}/', headers=user.headers,
+            json={'default_volume': random.randint(20, 80)}, timeout=30)
+
+    if operation == 'toggle_schedule':
+        schedule_id = random.choice(user.schedule_ids) if user.schedule_ids else 'missing'
+        return session.post(
+            f'{API_BASE}/schedules/schedules/{schedule_id}/toggle/', headers=user.headers,
+            json={'enabled': user.counter % 2 == 0}, timeout=30)
+
+    raise ValueError(f'Unknown operation: {operation}')
+
+
+def timed_request(pool, stats, user, operation, scheduled_at):
+    """Run one operation and record latency from its scheduled arrival time."""
+    session = pool.get()
+    try:
+        status = run_operation(session, user, operation).status_code
+    except Exception as e:
+        # Any failure counts as an error, not just transport errors
+        status = type(e).__name__
+    latency_ms = (time.perf_counter() - scheduled_at) * 1000
+    stats.record(ENDPOINT_LABELS[operation], latency_ms, status)
+
+
+def run_stage(users, rate, duration, workers, seed, allow_writes):
+    """Replay open-loop traffic at `rate` requests/second for `duration` seconds."""
+    rng = random.Random(seed)
+    operations = [o for o in TRAFFIC_MIX if allow_writes or o not in WRITE_OPERATIONS]
+    weights = [TRAFFIC_MIX[o] for o in operations]
+    pool = SessionPool(workers)
+    stats = Stats()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        next_arrival = started
+        end = started + duration
+        while next_arrival < end:
+            delay = next_arrival - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            user = users[rng.randrange(len(users))]
+            operation = rng.choices(operations, weights)[0]
+            executor.submit(timed_request, pool, stats, user, operation, next_arrival)
+            next_arrival += rng.expovariate(rate)
+    elapsed = time.perf_counter() - started
+
+    return stats, elapsed
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def histogram(latencies):
+    counts = [0] * (len(BUCKETS_MS) + 1)
+    for latency in latencies:
+        counts[bisect.bisect_left(BUCKETS_MS, latency)] += 1
+    return counts
+
+
+def print_stage_report(rate, stats, elapsed):
+    total = sum(len(v) for v in stats.latencies.values())
+    errors = sum(stats.errors.values())
+    if not total:
+        print(f"\n📈 Offered rate {rate:g} req/s: no requests")
+        return 0.0, 0.0
+    print(f"\n📈 Offered rate {rate:g} req/s: {total} requests in {elapsed:.1f}s "
+          f"→ {total / elapsed:.1f} req/s completed, error rate {errors / total:.1%}")
+
+    print(f"  {'endpoint':<38} {'count':>6} {'err%':>6} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}")
+    for endpoint in sorted(stats.latencies):
+        values = sorted(stats.latencies[endpoint])
+        count = len(values)
+        print(f"  {endpoint:<38} {count:>6} {stats.errors[endpoint] / count:>6.1%} "
+              f"{percentile(values, 50):>7.0f}ms {percentile(values, 90):>7.0f}ms "
+              f"{percentile(values, 99):>7.0f}ms {values[-1]:>7.0f}ms")
+
+    for endpoint in sorted(stats.latencies):
+        values = stats.latencies[endpoint]
+        counts = histogram(values)
+        peak = max(counts) or 1
+        print(f"\n  {endpoint}")
+        labels = [f'<={b}ms' for b in BUCKETS_MS] + [f'>{BUCKETS_MS[-1]}ms']
+        for label, count in zip(labels, counts):
+            if count:
+                print(f"    {label:>9} {count:>6} {'#' * max(1, int(40 * count / peak))}")
+        codes = ', '.join(f'{code}: {n}' for code, n in sorted(stats.status_codes[endpoint].items(), key=str))
+        print(f"    status {codes}")
+
+    return total / elapsed, errors / total
+
+
+def main():
+    global API_BASE
+
+    parser = argparse.ArgumentParser(description='Open-loop mixed-traffic load runner')
+    parser.add_argument('--base-url', default=API_BASE)
+    parser.add_argument('--email', default='admin@sync2gear.com')
+    parser.add_argument('--password', default='admin123')
+    parser.add_argument('--users', type=int, default=10, help='Concurrent virtual users')
+    parser.add_argument('--rates', default='5,10,20', help='Comma-separated offered rates (req/s), one stage each')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds per stage')
+    parser.add_argument('--workers', type=int, default=0, help='Max in-flight requests (default: 4x users)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--allow-writes', action='store_true',
+                        help='Also create TTS announcements (may call a paid TTS provider), update zones '
+                             'and toggle schedules; undone when the run ends')
+    args = parser.parse_args()
+
+    API_BASE = args.base_url.rstrip('/')
+    workers = args.workers or args.users * 4
+    rates = [float(r) for r in args.rates.split(',') if r.strip()]
+    if not rates or any(rate <= 0 for rate in rates):
+        parser.error('--rates must be positive numbers')
+    if args.users < 1:
+        parser.error('--users must be at least 1')
+
+    print("=" * 60)
+    print("API LOAD TEST")
+    print("=" * 60)
+    print(f"Target: {API_BASE}")
+    print(f"Virtual users: {args.users}, workers: {workers}, stages: {rates} req/s x {args.duration:g}s")
+    if args.allow_writes:
+        print("Traffic: full mix, including writes (undone when the run ends)")
+    else:
+        print("Traffic: read-only (login, list music); pass --allow-writes for the full mix")
+
+    print("\n🔐 Logging in virtual users...")
+    users = [VirtualUser(i, args.email, args.password) for i in range(args.users)]
+    setup_pool = SessionPool(workers)
+    if not try_login(setup_pool.get(), users[0]):
+        print("❌ Failed to login")
+        return
+
+    shared = None
+    if args.allow_writes:
+        shared = prepare_shared_ids(setup_pool.get(), users[0])
+        print(f"  ✅ Using {len(shared['zone_ids'])} zone(s), {len(shared['schedule_ids'])} schedule(s)")
+
+    summary = []
+    try:
+        with ThreadPoolExecutor(max_workers=min(workers, len(users))) as executor:
+            ready = [True] + list(executor.map(lambda u: try_login(setup_pool.get(), u), users[1:]))
+        users = [u for u, ok in zip(users, ready) if ok]
+        if shared:
+            for user in users:
+                user.client_id = shared['client_id']
+                user.zone_ids = shared['zone_ids']
+                user.schedule_ids = shared['schedule_ids']
+        print(f"  ✅ {len(users)} users ready")
+
+        for stage, rate in enumerate(rates):
+            stats, elapsed = run_stage(users, rate, args.duration, workers, args.seed + stage, args.allow_writes)
+            summary.append((rate,) + print_stage_report(rate, stats, elapsed))
+    finally:
+        if shared:
+            clean_up(setup_pool.get(), users[0], shared, users)
+
+    print("\n" + "=" * 60)
+    print("SUMMARY")
+    print("=" * 60)
+    print(f"  {'offered':>10} {'completed':>10} {'errors':>8}")
+    for rate, throughput, error_rate in summary:
+        print(f"  {rate:>8g}/s {throughput:>8.1f}/s {error_rate:>8.1%}")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception as e:
+        print(f"\n❌ Error: {e}")
+        import traceback
+        traceback.print_exc()
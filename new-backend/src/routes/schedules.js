@@ -1,6 +1,7 @@
 const express = require('express');
 const { authenticate } = require('../middleware/auth');
 const { getEffectiveClient } = require('../middleware/utils');
+const { notifySchedulesChanged } = require('../services/realtime');
 
 const router = express.Router();
 
@@ -55,6 +56,7 @@ router.post('/schedules/', authenticate, async (req, res) => {
     const { name, schedule_config, zones, devices, priority, enabled } = req.body;
 
     // In production, would create Schedule model instance
+    await notifySchedulesChanged();
     return res.status(201).json({
       id: 'placeholder-id',
       name: name || 'New Schedule',
@@ -72,6 +74,7 @@ router.post('/schedules/', authenticate, async (req, res) => {
 router.patch('/schedules/:id/', authenticate, async (req, res) => {
   try {
     // In production, would update Schedule model
+    await notifySchedulesChanged();
     return res.status(200).json({
       id: req.params.id,
       ...req.body,
@@ -87,6 +90,7 @@ router.patch('/schedules/:id/', authenticate, async (req, res) => {
 router.delete('/schedules/:id/', authenticate, async (req, res) => {
   try {
     // In production, would delete Schedule model
+    await notifySchedulesChanged();
     return res.status(204).send();
   } catch (error) {
     console.error('Delete schedule error:', error);
@@ -99,6 +103,7 @@ router.post('/schedules/:id/toggle/', authenticate, async (req, res) => {
   try {
     const { enabled } = req.body;
     // In production, would update Schedule model
+    await notifySchedulesChanged();
     return res.status(200).json({
       id: req.params.id,
       enabled: enabled !== undefined ? enabled : true,
@@ -3,6 +3,7 @@ const Zone = require('../models/Zone');
 const Floor = require('../models/Floor');
 const Device = require('../models/Device');
 const { authenticate } = require('../middleware/auth');
+const { publishZoneState } = require('../services/realtime');
 
 const router = express.Router();
 
@@ -308,6 +309,7 @@ router.post('/zones/', authenticate, async (req, res) => {
       }
     }
     
+    await publishZoneState(zoneObj);
     res.status(201).json(zoneObj);
   } catch (error) {
     if (error.code === 11000) {
@@ -350,6 +352,7 @@ router.patch('/zones/:id/', authenticate, async (req, res) => {
       }
     }
     
+    await publishZoneState(zoneObj);
     res.json(zoneObj);
   } catch (error) {
     console.error('Update zone error:', error);
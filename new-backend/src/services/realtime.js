@@ -0,0 +1,64 @@
+const { LambdaClient, InvokeCommand } = require('@aws-sdk/client-lambda');
+
+// In Lambda, credentials are automatically provided by the execution role
+const lambdaClient = new LambdaClient({
+  region: process.env.AWS_REGION || 'us-east-1',
+});
+
+// Unset in local development: notifications are skipped
+const SCHEDULER_FUNCTION_NAME = process.env.SCHEDULER_FUNCTION_NAME || '';
+const WEBSOCKET_FUNCTION_NAME = process.env.WEBSOCKET_FUNCTION_NAME || '';
+
+/**
+ * Invoke a Lambda function asynchronously (fire-and-forget)
+ * Failures are logged, never thrown, so they cannot fail the API request
+ * @param {string} functionName - Lambda function name or ARN
+ * @param {object} payload - Event passed to the function
+ * @returns {Promise<void>}
+ */
+async function invokeAsync(functionName, payload) {
+  if (!functionName) {
+    return;
+  }
+
+  try {
+    const command = new InvokeCommand({
+      FunctionName: functionName,
+      InvocationType: 'Event',
+      Payload: Buffer.from(JSON.stringify(payload)),
+    });
+    await lambdaClient.send(command);
+  } catch (error) {
+    console.error(`[Realtime] Failed to invoke ${functionName}:`, error.message);
+  }
+}
+
+/**
+ * Tell the scheduler that schedules changed
+ * The scheduler bumps its shared playout plan version, and every warm
+ * scheduler container rebuilds its plan on the next tick
+ * @returns {Promise<void>}
+ */
+async function notifySchedulesChanged() {
+  await invokeAsync(SCHEDULER_FUNCTION_NAME, { action: 'rebuild_plan' });
+}
+
+/**
+ * Publish a zone's saved state to subscribed devices
+ * The WebSocket handler keeps the full record as the zone snapshot and
+ * broadcasts (and logs for delta sync) only the fields that changed
+ * @param {object} zoneObj - Zone as returned by the REST API (zone.toJSON() plus extras)
+ * @returns {Promise<void>}
+ */
+async function publishZoneState(zoneObj) {
+  await invokeAsync(WEBSOCKET_FUNCTION_NAME, {
+    action: 'zone_changed',
+    zoneId: zoneObj.id,
+    state: zoneObj,
+  });
+}
+
+module.exports = {
+  notifySchedulesChanged,
+  publishZoneState,
+};